@@ -1,12 +1,12 @@
-import os
 import random
 import sys
-from functools import wraps
+from collections import deque
+from itertools import islice
+from queue import Empty, Queue
 from string import capwords
+from threading import Event, Thread
 
 import typer
-from prompt_toolkit import PromptSession
-from prompt_toolkit.completion import FuzzyCompleter, WordCompleter
 from rich.console import Console, Group
 from rich.padding import Padding
 from rich.panel import Panel
@@ -15,17 +15,22 @@ from rich.text import Text
 from typing_extensions import Annotated
 
 from .config import Config as config
-from .utils import (
-    generate_pokemon_coloring_page,
-    get_pokedex,
-    get_types,
-    memory,
-    parallel_cache_pokeapi_calls,
-    pokemon_id2name,
-    pokemon_id2types,
-    pokemon_name2id,
+
+SELECTED_TEXT = Text.assemble(
+    "Selected Pokémon (",
+    ("auto", config.COLOR_UNSELECTED_POKEMON),
+    "/",
+    ("manual", config.COLOR_SELECTED_POKEMON),
+    "):",
+)
+
+PAGE_SIZE_SUGGESTIONS = tuple(
+    f":page_size {page_size}" for page_size in config.STANDARD_PAGE_SIZES_BY_NAME_MM
 )
 
+# Command names mapped to the attribute names of their methods
+COMMANDS = {}
+
 
 def command(
     command_name: str = None,
@@ -34,19 +39,15 @@ def command(
     command_short: str = None,
 ):
     def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
-
-        wrapper.is_command = True
-        wrapper.command_help = command_help
-        wrapper.command_short = command_short
-        wrapper.command_arg_desc = command_arg_desc
+        func.command_help = command_help
+        func.command_short = command_short
+        func.command_arg_desc = command_arg_desc
         if command_name:
-            wrapper.command_name = command_name
+            func.command_name = command_name
         else:
-            wrapper.command_name = func.__name__
-        return wrapper
+            func.command_name = func.__name__
+        COMMANDS[func.command_name] = func.__name__
+        return func
 
     return decorator
 
@@ -54,9 +55,64 @@ def command(
 class PokemonColoringPageCLI:
     """Class for the Pokémon Coloring Page CLI."""
 
+    __slots__ = (
+        # Settings
+        "PAGE_WIDTH_MM",
+        "PAGE_HEIGHT_MM",
+        "OUTER_MARGIN_MM",
+        "INNER_MARGIN_MM",
+        "FONT_SIZE_MM",
+        "ROWS",
+        "COLUMNS",
+        "COLOR",
+        "CROP",
+        "FUZZY",
+        "FILTER",
+        "MESSAGES",
+        "INITIAL_PAGE_WIDTH_MM",
+        "INITIAL_PAGE_HEIGHT_MM",
+        "INITIAL_OUTER_MARGIN_MM",
+        "INITIAL_INNER_MARGIN_MM",
+        "INITIAL_FONT_SIZE_MM",
+        "INITIAL_ROWS",
+        "INITIAL_COLUMNS",
+        "INITIAL_COLOR",
+        "INITIAL_CROP",
+        # State
+        "console",
+        "session",
+        "completer",
+        "commands",
+        "command_funcs",
+        "static_suggestions",
+        "pokedex",
+        "pokedex_keys",
+        "pokemon_names",
+        "pokemon_types",
+        "selected_pokemon",
+        "selected_set",
+        "user_selected_pokemon",
+        "prefetch_queue",
+        "prefetch_pending",
+        "prefetch_running",
+        "prefetch_errors",
+        "prefetch_reported",
+        "prefetched",
+        # Render caches
+        "info_panel",
+        "info_key",
+        "page_setup",
+        "page_setup_key",
+        "help_text",
+    )
+
     def __init__(self):
         self.console = Console()
-        self.panel_width = None
+        self.info_panel = None
+        self.page_setup = None
+        self.page_setup_key = None
+        self.info_key = None
+        self.help_text = None
 
     def _n_pokemon(self):
         return self.ROWS * self.COLUMNS
@@ -68,19 +124,15 @@ class PokemonColoringPageCLI:
             self.MESSAGES.append(Text(message, style=config.COLOR_MESSAGE))
 
     def _print_messages(self):
-        for message in self.MESSAGES:
-            self.console.print(message)
+        if self.MESSAGES:
+            self.console.print(Group(*self.MESSAGES))
         self.MESSAGES = []
 
     def _get_page_description(self):
-        description = "Custom"
-
         # Find page size description
-        for page_size, (width, height) in config.STANDARD_PAGE_SIZES_MM.items():
-            if width in (self.PAGE_WIDTH_MM, self.PAGE_HEIGHT_MM):
-                if height in (self.PAGE_WIDTH_MM, self.PAGE_HEIGHT_MM):
-                    description = page_size
-                    break
+        description = config.STANDARD_PAGE_SIZES_BY_DIMS_MM.get(
+            frozenset((self.PAGE_WIDTH_MM, self.PAGE_HEIGHT_MM)), "Custom"
+        )
 
         # Get orientation
         if self.PAGE_WIDTH_MM > self.PAGE_HEIGHT_MM:
@@ -90,29 +142,74 @@ class PokemonColoringPageCLI:
 
         return description
 
+    def _set_selection(self, pokemon_ids=()):
+        # Selection is bounded by the grid size
+        n_pokemon = max(self._n_pokemon(), 0)
+        self.selected_pokemon = deque(islice(pokemon_ids, n_pokemon), maxlen=n_pokemon)
+        self.selected_set = set(self.selected_pokemon)
+
+    def _select_pokemon(self, pokemon_id):
+        # Nothing can be stored without grid cells
+        if self.selected_pokemon.maxlen == 0:
+            return
+
+        # Drop the last Pokémon if the selection is full
+        if 0 < len(self.selected_pokemon) == self.selected_pokemon.maxlen:
+            self.selected_set.discard(self.selected_pokemon.pop())
+        self.selected_pokemon.appendleft(pokemon_id)
+        self.selected_set.add(pokemon_id)
+
+    def _set_number(self, attr: str, value: str, cast, label: str):
+        try:
+            setattr(self, attr, cast(value))
+        except ValueError:
+            self._add_message(f"Invalid {label}. Please try again.")
+
     def _random_select_pokemon(self):
-        # Add missing pokemon to list
-        while len(self.selected_pokemon) < self._n_pokemon():
-            new_pokemon = random.choice(list(self.pokedex.keys()))
-            if new_pokemon not in self.selected_pokemon:
-                self.selected_pokemon.append(new_pokemon)
+        n_pokemon = self._n_pokemon()
 
-        # Remove pokemon if list is full
-        self.selected_pokemon = self.selected_pokemon[: self._n_pokemon()]
+        # Resize selection if the grid has changed
+        if self.selected_pokemon.maxlen != max(n_pokemon, 0):
+            self._set_selection(self.selected_pokemon)
+
+        # Add missing pokemon to list
+        n_missing = n_pokemon - len(self.selected_pokemon)
+        if n_missing > 0:
+            remaining = [p for p in self.pokedex_keys if p not in self.selected_set]
+            new_pokemon = random.sample(remaining, min(n_missing, len(remaining)))
+            self.selected_pokemon.extend(new_pokemon)
+            self.selected_set.update(new_pokemon)
 
         # Reduce user selected pokemon if needed
-        self.user_selected_pokemon = min(self.user_selected_pokemon, self._n_pokemon())
+        self.user_selected_pokemon = min(self.user_selected_pokemon, n_pokemon)
 
-    def _print_info(self, clear_screen: bool = True):
-        # Clear the screen
-        if clear_screen:
-            os.system("cls" if os.name == "nt" else "clear")
+    def _get_page_setup_key(self):
+        return (
+            self.PAGE_WIDTH_MM,
+            self.PAGE_HEIGHT_MM,
+            self.OUTER_MARGIN_MM,
+            self.INNER_MARGIN_MM,
+            self.FONT_SIZE_MM,
+            self.COLUMNS,
+            self.ROWS,
+            self.COLOR,
+            self.CROP,
+        )
 
-        title = Text("Pokémon ")
-        for letter in "COLORING":
-            title.append(letter, style=f"color({random.randint(1, 15)})")
-        title.append(" page CLI")
-        title.style = "bold"
+    def _get_info_key(self):
+        # Everything shown on the info screen
+        return (
+            self._get_page_setup_key(),
+            tuple(self.selected_pokemon),
+            self.user_selected_pokemon,
+            self.FILTER,
+        )
+
+    def _get_page_setup_table(self):
+        # Only rebuild the table when the page setup has changed
+        page_setup_key = self._get_page_setup_key()
+        if page_setup_key == self.page_setup_key:
+            return self.page_setup
 
         page_setup = Table(show_header=False, box=None, style=config.COLOR_PAGE_SETUP)
         page_setup.add_column("Option", style=config.COLOR_PAGE_SETUP)
@@ -129,34 +226,42 @@ class PokemonColoringPageCLI:
         page_setup.add_row("Color", f"{self.COLOR}")
         page_setup.add_row("Crop", f"{self.CROP}")
 
-        selected_text = Text("Selected Pokémon (")
-        selected_text.append("auto", style=config.COLOR_UNSELECTED_POKEMON)
-        selected_text.append("/")
-        selected_text.append("manual", style=config.COLOR_SELECTED_POKEMON)
-        selected_text.append("):")
+        self.page_setup = page_setup
+        self.page_setup_key = page_setup_key
+        return page_setup
+
+    def _print_info(self, clear_screen: bool = True):
+        # Clear the screen
+        if clear_screen:
+            self.console.clear()
+
+        title = Text("Pokémon ")
+        for letter in "COLORING":
+            title.append(letter, style=f"color({random.randint(1, 15)})")
+        title.append(" page CLI")
+        title.style = "bold"
+
+        page_setup = self._get_page_setup_table()
 
         # Print selected pokemon
-        cc = 0
         selected_pokemon = Table(show_header=False, box=None)
         selected_pokemon.add_column("Number")
         selected_pokemon.add_column("Name")
         selected_pokemon.add_column("Types")
 
-        for pokemon_id in self.selected_pokemon:
+        for i, pokemon_id in enumerate(self.selected_pokemon):
             color = (
                 config.COLOR_SELECTED_POKEMON
-                if cc < self.user_selected_pokemon
+                if i < self.user_selected_pokemon
                 else config.COLOR_UNSELECTED_POKEMON
             )
-            pokemon_name = capwords(pokemon_id2name(pokemon_id))
-            pokemon_types = capwords(", ".join(pokemon_id2types(pokemon_id)))
+            pokemon_name = self.pokemon_names[pokemon_id]
+            pokemon_types = self.pokemon_types[pokemon_id]
 
             selected_pokemon.add_row(
                 str(pokemon_id), pokemon_name, pokemon_types, style=color
             )
 
-            cc += 1
-
         info_table = Table(
             show_header=False,
             show_lines=False,
@@ -166,7 +271,7 @@ class PokemonColoringPageCLI:
         info_table.add_column("Selected Pokémon")
         info_table.add_column("Page setup")
 
-        info_table.add_row(selected_text, "Page setup:")
+        info_table.add_row(SELECTED_TEXT, "Page setup:")
         info_table.add_row(selected_pokemon, page_setup)
 
         info = [Padding(info_table, (1, 0))]
@@ -179,16 +284,12 @@ class PokemonColoringPageCLI:
 
         info.append(f"Use [{config.COLOR_COMMAND}]:help[/] command for help.")
 
-        info_panel = Panel(Group(*info), title=title, expand=False)
-
-        self.panel_width = info_panel.__rich_measure__(
-            self.console, self.console.options
-        ).maximum
+        # Kept for :help, which measures it to match the panel width
+        self.info_panel = Panel(Group(*info), title=title, expand=False)
 
-        self.console.print(info_panel)
+        self.console.print(self.info_panel)
 
-    @command("help", command_help="Show help", command_short="h")
-    def _help(self, _):
+    def _get_help_text(self):
         # Build command description
 
         table = Table(
@@ -225,11 +326,25 @@ class PokemonColoringPageCLI:
             f"Use [{config.COLOR_COMMAND}]:write[/] to genereate coloring page and save directly to file.",
         ]
 
+        return Group(*msg_list)
+
+    @command("help", command_help="Show help", command_short="h")
+    def _help(self, _):
+        # The commands do not change while running, so build the text once
+        if self.help_text is None:
+            self.help_text = self._get_help_text()
+
+        panel_width = None
+        if self.info_panel is not None:
+            panel_width = self.info_panel.__rich_measure__(
+                self.console, self.console.options
+            ).maximum
+
         self._add_message(
             Panel(
-                Group(*msg_list),
+                self.help_text,
                 title="Help",
-                width=self.panel_width,
+                width=panel_width,
             ),
             custom_colors=True,
         )
@@ -251,7 +366,7 @@ class PokemonColoringPageCLI:
         command_help="Clear selection and reselect random Pokémon",
     )
     def _clear(self, _):
-        self.selected_pokemon = []
+        self._set_selection()
         self.user_selected_pokemon = 0
 
     @command("reset_page", command_help="Reset page setup")
@@ -270,44 +385,29 @@ class PokemonColoringPageCLI:
         "page_width", command_arg_desc="width", command_help="Set page width in mm"
     )
     def _set_page_width(self, page_width: str):
-        try:
-            self.PAGE_WIDTH_MM = float(page_width)
-        except ValueError:
-            self._add_message("Invalid page width. Please try again.")
+        self._set_number("PAGE_WIDTH_MM", page_width, float, "page width")
 
     @command(
         "page_height", command_arg_desc="height", command_help="Set page height in mm"
     )
     def _set_page_height(self, page_height: str):
-        try:
-            self.PAGE_HEIGHT_MM = float(page_height)
-        except ValueError:
-            self._add_message("Invalid page height. Please try again.")
+        self._set_number("PAGE_HEIGHT_MM", page_height, float, "page height")
 
     @command(
         "outer_margin", command_arg_desc="margin", command_help="Set outer margin in mm"
     )
     def _set_outer_margin(self, outer_margin: str):
-        try:
-            self.OUTER_MARGIN_MM = float(outer_margin)
-        except ValueError:
-            self._add_message("Invalid outer margin. Please try again.")
+        self._set_number("OUTER_MARGIN_MM", outer_margin, float, "outer margin")
 
     @command(
         "inner_margin", command_arg_desc="margin", command_help="Set inner margin in mm"
     )
     def _set_inner_margin(self, inner_margin: str):
-        try:
-            self.INNER_MARGIN_MM = float(inner_margin)
-        except ValueError:
-            self._add_message("Invalid inner margin. Please try again.")
+        self._set_number("INNER_MARGIN_MM", inner_margin, float, "inner margin")
 
     @command("font_size", command_arg_desc="size", command_help="Set font size in mm")
     def _set_font_size(self, font_size: str):
-        try:
-            self.FONT_SIZE_MM = float(font_size)
-        except ValueError:
-            self._add_message("Invalid font size. Please try again.")
+        self._set_number("FONT_SIZE_MM", font_size, float, "font size")
 
     @command(
         "rows",
@@ -316,10 +416,7 @@ class PokemonColoringPageCLI:
         command_short="r",
     )
     def _set_rows(self, rows: str):
-        try:
-            self.ROWS = int(rows)
-        except ValueError:
-            self._add_message("Invalid number of rows. Please try again.")
+        self._set_number("ROWS", rows, int, "number of rows")
 
     @command(
         "columns",
@@ -328,10 +425,7 @@ class PokemonColoringPageCLI:
         command_short="c",
     )
     def _set_columns(self, columns: str):
-        try:
-            self.COLUMNS = int(columns)
-        except ValueError:
-            self._add_message("Invalid number of columns. Please try again.")
+        self._set_number("COLUMNS", columns, int, "number of columns")
 
     @command(
         "page_orientation",
@@ -353,23 +447,18 @@ class PokemonColoringPageCLI:
         command_help="Set a standard page size and orientation",
     )
     def _set_page_size(self, page_size: str):
-        try:
-            orientation = page_size.split(" ")[-1]
-            page_size_name = " ".join(page_size.split(" ")[:-1])
-
-            width, height = config.STANDARD_PAGE_SIZES_MM[page_size_name]
-
-            if orientation == "Landscape":
-                width, height = height, width
-
-            self.PAGE_WIDTH_MM = width
-            self.PAGE_HEIGHT_MM = height
+        size = config.STANDARD_PAGE_SIZES_BY_NAME_MM.get(page_size)
 
-        except KeyError:
+        if size is None:
             self._add_message("Invalid page size. Please try again.")
+            return
+
+        self.PAGE_WIDTH_MM, self.PAGE_HEIGHT_MM = size
 
     @command("types", command_help="List all Pokémon types and their count")
     def _list_types(self, _):
+        from .utils import get_types
+
         for type, pokemon in get_types().items():
             self._add_message(f"{capwords(type)} ({len(pokemon)})")
 
@@ -379,14 +468,17 @@ class PokemonColoringPageCLI:
         command_arg_desc="type",
     )
     def _type_filter(self, type_filter: str):
+        from .utils import get_pokedex, get_types, pokemon_id2types
+
         self.FILTER = None
 
         if type_filter == "":
             self.pokedex = get_pokedex()
+            self.pokedex_keys = tuple(self.pokedex)
             self._add_prompt_suggestions()
             return
 
-        if type_filter.lower() not in get_types().keys():
+        if type_filter.lower() not in get_types():
             self._add_message("Invalid type. Please try again.")
             return
 
@@ -398,17 +490,20 @@ class PokemonColoringPageCLI:
 
         self.FILTER = type_filter
 
-        for i in range(self.user_selected_pokemon):
-            if type_filter.lower() not in pokemon_id2types(self.selected_pokemon[i]):
-                self.user_selected_pokemon -= 1
+        # Count the manually selected Pokémon that match the filter
+        self.user_selected_pokemon = sum(
+            type_filter.lower() in pokemon_id2types(pokemon_id)
+            for pokemon_id in islice(self.selected_pokemon, self.user_selected_pokemon)
+        )
 
-        self.selected_pokemon = [
+        self._set_selection(
             pokemon_id
             for pokemon_id in self.selected_pokemon
             if type_filter.lower() in pokemon_id2types(pokemon_id)
-        ]
+        )
 
         self.pokedex = get_pokedex(type_filter=type_filter)
+        self.pokedex_keys = tuple(self.pokedex)
         self._add_prompt_suggestions()
 
     @command(
@@ -437,7 +532,8 @@ class PokemonColoringPageCLI:
     )
     def _set_grid(self, grid: str):
         try:
-            columns, rows = map(int, grid.split(" "))
+            columns_str, _, rows_str = grid.partition(" ")
+            columns, rows = int(columns_str), int(rows_str)
             self.COLUMNS = columns
             self.ROWS = rows
         except ValueError:
@@ -445,45 +541,97 @@ class PokemonColoringPageCLI:
 
     def _get_commands(self):
         commands = {}
-        for name in dir(self):
-            attr = getattr(self, name)
-            if callable(attr) and hasattr(attr, "is_command"):
-                commands[attr.command_name] = {
-                    "func": attr,
-                    "help": attr.command_help,
-                    "arg_desc": attr.command_arg_desc,
-                    "short": attr.command_short,
-                }
+        for command_name, attr_name in COMMANDS.items():
+            attr = getattr(self, attr_name)
+            commands[command_name] = {
+                "func": attr,
+                "help": attr.command_help,
+                "arg_desc": attr.command_arg_desc,
+                "short": attr.command_short,
+            }
         return commands
 
     def _add_prompt_suggestions(self):
         # Define a list of suggestions
-        suggestions = [capwords(pokemon) for pokemon in self.pokedex.values()]
+        suggestions = [self.pokemon_names[pokemon_id] for pokemon_id in self.pokedex]
+
+        # Add commands, types and page sizes to suggestions
+        suggestions += self.static_suggestions
+
+        # Update the session completer
+        self.completer.set_suggestions(suggestions)
 
-        # Add commands to suggestions
-        suggestions += [f":{command}" for command in self.commands.keys()]
+    def _get_static_suggestions(self):
+        from .utils import get_types
 
-        # List page sizes
-        page_sizes = []
-        for page_size in config.STANDARD_PAGE_SIZES_MM.keys():
-            for orientation in ["Portrait", "Landscape"]:
-                page_sizes.append(f":page_size {page_size} {orientation}")
+        # Commands
+        suggestions = [f":{command}" for command in self.commands.keys()]
 
-        # List types
+        # Types
         suggestions += [f":type_filter {capwords(type)}" for type in get_types().keys()]
 
-        # Add page sizes to suggestions
-        suggestions += page_sizes
+        # Page sizes
+        suggestions += PAGE_SIZE_SUGGESTIONS
+
+        return suggestions
+
+    def _prefetch_worker(self):
+        from .utils import parallel_cache_pokeapi_calls
+
+        while True:
+            pokemon_ids = self.prefetch_queue.get()
+            self.prefetch_running = (pokemon_ids, Event())
+            try:
+                errors = []
+                failed = parallel_cache_pokeapi_calls(pokemon_ids, errors=errors)
+                # Only mark fetched Pokémon as done, so failed ones are retried
+                self.prefetched.update(p for p in pokemon_ids if p not in failed)
+                # Report each failure once instead of on every retry
+                for error in errors:
+                    if error not in self.prefetch_reported:
+                        self.prefetch_reported.add(error)
+                        self.prefetch_errors.append(error)
+            finally:
+                self.prefetch_pending.difference_update(pokemon_ids)
+                self.prefetch_running[1].set()
+                self.prefetch_running = None
+
+    def _prefetch_selection(self):
+        # Show failures from the background
+        while self.prefetch_errors:
+            self._add_message(self.prefetch_errors.pop(0))
+
+        # Warm the cache for newly selected Pokémon in the background
+        new_pokemon = [
+            p
+            for p in self.selected_pokemon
+            if p not in self.prefetched and p not in self.prefetch_pending
+        ]
+        if new_pokemon:
+            self.prefetch_pending.update(new_pokemon)
+            self.prefetch_queue.put(new_pokemon)
 
-        # Create FuzzyCompleter
-        word_completer = WordCompleter(suggestions)
-        fuzzy_completer = FuzzyCompleter(word_completer)
+    def _cancel_prefetches(self):
+        # Drop queued prefetches, as the selection is fetched when generating
+        while True:
+            try:
+                pokemon_ids = self.prefetch_queue.get_nowait()
+            except Empty:
+                break
+            self.prefetch_pending.difference_update(pokemon_ids)
 
-        # Add fuzzy completer to session
-        self.session.completer = fuzzy_completer
+        # Wait for a running prefetch only if it fetches Pokémon on the page
+        running = self.prefetch_running
+        if running and not set(running[0]).isdisjoint(self.selected_pokemon):
+            running[1].wait()
 
     def _generate_coloring_page(self):
-        parallel_cache_pokeapi_calls(self.selected_pokemon)
+        from .utils import generate_pokemon_coloring_page, parallel_cache_pokeapi_calls
+
+        self._cancel_prefetches()
+
+        errors = []
+        parallel_cache_pokeapi_calls(self.selected_pokemon, errors=errors)
         output_image = generate_pokemon_coloring_page(
             include_list=self.selected_pokemon,
             exclude_list=[],
@@ -496,7 +644,12 @@ class PokemonColoringPageCLI:
             font_size_mm=self.FONT_SIZE_MM,
             color=self.COLOR,
             crop=self.CROP,
+            errors=errors,
         )
+
+        for error in errors:
+            self._add_message(error)
+
         return output_image
 
     def run(
@@ -522,11 +675,18 @@ class PokemonColoringPageCLI:
         ] = config.COLUMNS,
         color: Annotated[bool, typer.Option(help="Color images")] = config.COLOR,
         crop: Annotated[bool, typer.Option(help="Crop images")] = config.CROP,
+        fuzzy: Annotated[
+            bool, typer.Option(help="Fuzzy match prompt suggestions")
+        ] = config.FUZZY,
         clear_cache: Annotated[bool, typer.Option(help="Clear PokeAPI cache")] = False,
     ):
         """
         Run the Pokémon Coloring Page CLI.
         """
+        from prompt_toolkit import PromptSession
+
+        from .completion import PrefixCompleter, RapidFuzzCompleter
+        from .utils import get_pokedex, memory, pokemon_id2types, pokemon_name2id
 
         # Clear cache
         if clear_cache:
@@ -555,28 +715,69 @@ class PokemonColoringPageCLI:
         self.CROP = crop
 
         # Other variables
+        self.FUZZY = fuzzy
         self.MESSAGES = []
         self.FILTER = None
 
         # Initialize selected pokemon
-        self.selected_pokemon = []
+        self._set_selection()
         self.user_selected_pokemon = 0
 
         # Get commands
         self.commands = self._get_commands()
+        self.command_funcs = {
+            command_info["short"]: command_info["func"]
+            for command_info in self.commands.values()
+            if command_info["short"]
+        }
+        self.command_funcs.update(
+            (command_name, command_info["func"])
+            for command_name, command_info in self.commands.items()
+        )
 
         # Get pokedex
         self.pokedex = get_pokedex()
+        self.pokedex_keys = tuple(self.pokedex)
+
+        # Display names and types
+        self.pokemon_names = {
+            pokemon_id: capwords(name) for pokemon_id, name in self.pokedex.items()
+        }
+        self.pokemon_types = {
+            pokemon_id: capwords(", ".join(pokemon_id2types(pokemon_id)))
+            for pokemon_id in self.pokedex
+        }
+
+        # Suggestions that do not depend on the type filter
+        self.static_suggestions = self._get_static_suggestions()
+
+        # Background cache warm-up for selected Pokémon
+        # Daemon thread, so quitting does not wait for a running prefetch
+        self.prefetch_queue = Queue()
+        self.prefetch_pending = set()
+        self.prefetch_running = None
+        self.prefetch_errors = []
+        self.prefetch_reported = set()
+        self.prefetched = set()
+        Thread(target=self._prefetch_worker, daemon=True).start()
 
         # Create a prompt session
-        self.session = PromptSession()
+        self.completer = RapidFuzzCompleter() if self.FUZZY else PrefixCompleter()
+        self.session = PromptSession(
+            completer=self.completer, complete_while_typing=False
+        )
         self._add_prompt_suggestions()
 
         while True:
             try:
                 self._random_select_pokemon()
+                self._prefetch_selection()
 
-                self._print_info()
+                # Only redraw the info screen if something on it has changed
+                info_key = self._get_info_key()
+                if info_key != self.info_key:
+                    self._print_info()
+                    self.info_key = info_key
                 self._print_messages()
 
                 user_input = self.session.prompt("> ")
@@ -597,18 +798,13 @@ class PokemonColoringPageCLI:
                     continue
 
                 if user_input.startswith(":"):
-                    command_name = user_input[1:].split(" ")[0]
-                    command_args = user_input[1 + len(command_name) :].strip()
-
-                    if command_name in self.commands:
-                        self.commands[command_name]["func"](command_args)
-                    elif command_name in [
-                        command["short"] for command in self.commands.values()
-                    ]:
-                        {
-                            command["short"]: command["func"]
-                            for command in self.commands.values()
-                        }[command_name](command_args)
+                    command_name, _, command_args = user_input[1:].partition(" ")
+                    command_args = command_args.strip()
+
+                    command_func = self.command_funcs.get(command_name)
+
+                    if command_func:
+                        command_func(command_args)
                     else:
                         self._add_message("Invalid command. Please try again.")
                     continue
@@ -621,19 +817,15 @@ class PokemonColoringPageCLI:
                     except ValueError:
                         pass
 
-                if pokemon_id not in self.pokedex.keys():
+                if pokemon_id not in self.pokedex:
                     self._add_message("Pokémon not found. Please try again.")
                     continue
 
-                if not pokemon_id:
-                    self._add_message("Invalid input. Please try again.")
-                    continue
-
-                if pokemon_id in self.selected_pokemon:
+                if pokemon_id in self.selected_set:
                     self._add_message("Pokémon already selected. Please try again.")
                     continue
 
-                self.selected_pokemon.insert(0, pokemon_id)
+                self._select_pokemon(pokemon_id)
                 self.user_selected_pokemon += 1
 
             except (KeyboardInterrupt, EOFError):
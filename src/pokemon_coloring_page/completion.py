@@ -0,0 +1,59 @@
+from bisect import bisect_left
+
+from prompt_toolkit.completion import Completer, Completion
+from rapidfuzz import fuzz, process
+
+
+class PrefixCompleter(Completer):
+    """Case-insensitive prefix completer backed by a sorted suggestion index."""
+
+    def __init__(self, suggestions=()):
+        self.set_suggestions(suggestions)
+
+    def set_suggestions(self, suggestions):
+        """Replace the suggestions and rebuild the index."""
+        self._choices = tuple(sorted(suggestions, key=str.lower))
+        # Match against lowercase choices, sorted the same way for bisect
+        self._choices_lower = tuple(choice.lower() for choice in self._choices)
+
+    def _prefix_matches(self, text: str):
+        start = bisect_left(self._choices_lower, text)
+        for index in range(start, len(self._choices_lower)):
+            if not self._choices_lower[index].startswith(text):
+                break
+            yield index
+
+    def get_completions(self, document, complete_event):
+        text = document.text_before_cursor
+        if not text:
+            return
+
+        for index in self._prefix_matches(text.lower()):
+            yield Completion(self._choices[index], start_position=-len(text))
+
+
+class RapidFuzzCompleter(PrefixCompleter):
+    """Prefix completer falling back to RapidFuzz ranking for other matches."""
+
+    def get_completions(self, document, complete_event):
+        text = document.text_before_cursor
+        if not text:
+            return
+
+        query = text.lower()
+        prefix_matches = set()
+
+        for index in self._prefix_matches(query):
+            prefix_matches.add(index)
+            yield Completion(self._choices[index], start_position=-len(text))
+
+        for _, _, index in process.extract(
+            query,
+            self._choices_lower,
+            scorer=fuzz.WRatio,
+            processor=None,
+            score_cutoff=70,
+            limit=20,
+        ):
+            if index not in prefix_matches:
+                yield Completion(self._choices[index], start_position=-len(text))
@@ -1,11 +1,13 @@
 from datetime import timedelta
 from pathlib import Path
+from types import MappingProxyType
 
 
 class Config:
     # Cache
     CACHE_DIR = Path.home() / ".cache" / "pokemon-coloring-page"
     CACHE_AGE_LIMIT = timedelta(days=7)
+    CACHE_REDUCE_INTERVAL = timedelta(days=1)
 
     # Attribution
     ATTRIBUTION = "Data source: pokeapi.co"
@@ -26,6 +28,9 @@ class Config:
     COLOR = False
     CROP = True
 
+    # Prompt completion
+    FUZZY = False
+
     # Page element colors
     COLOR_LINES = "gray"
     COLOR_NAMES = "gray"
@@ -40,23 +45,44 @@ class Config:
     COLOR_COMMAND = "#00afff"
 
     # Standard page sizes in mm (width, height) in portrait orientation
-    STANDARD_PAGE_SIZES_MM = {
-        "A0": (841, 1189),
-        "A1": (594, 841),
-        "A2": (420, 594),
-        "A3": (297, 420),
-        "A4": (210, 297),
-        "A5": (148, 210),
-        "Letter": (215.9, 279.4),
-        "Legal": (215.9, 355.6),
-        "Tabloid": (279.4, 431.8),
-        "Ledger": (279.4, 431.8),
-        "Junior Legal": (127, 203.2),
-        "Half Letter": (139.7, 215.9),
-        "Government Letter": (203.2, 266.7),
-        "Government Legal": (215.9, 330.2),
-        "ANSI A": (216, 279),
-        "ANSI B": (279, 432),
-        "ANSI C": (432, 559),
-        "ANSI D": (559, 864),
-    }
+    # Read-only, as the lookup tables below are derived from it
+    STANDARD_PAGE_SIZES_MM = MappingProxyType(
+        {
+            "A0": (841, 1189),
+            "A1": (594, 841),
+            "A2": (420, 594),
+            "A3": (297, 420),
+            "A4": (210, 297),
+            "A5": (148, 210),
+            "Letter": (215.9, 279.4),
+            "Legal": (215.9, 355.6),
+            "Tabloid": (279.4, 431.8),
+            "Ledger": (279.4, 431.8),
+            "Junior Legal": (127, 203.2),
+            "Half Letter": (139.7, 215.9),
+            "Government Letter": (203.2, 266.7),
+            "Government Legal": (215.9, 330.2),
+            "ANSI A": (216, 279),
+            "ANSI B": (279, 432),
+            "ANSI C": (432, 559),
+            "ANSI D": (559, 864),
+        }
+    )
+
+    # Standard page size names keyed by their dimensions in any orientation.
+    # Reversed so the first name wins when two sizes share dimensions.
+    STANDARD_PAGE_SIZES_BY_DIMS_MM = MappingProxyType(
+        {
+            frozenset(size): name
+            for name, size in reversed(STANDARD_PAGE_SIZES_MM.items())
+        }
+    )
+
+    # Standard page sizes keyed by "<name> <orientation>" as used by :page_size
+    STANDARD_PAGE_SIZES_BY_NAME_MM = MappingProxyType(
+        {
+            f"{name} {orientation}": size if orientation == "Portrait" else size[::-1]
+            for name, size in STANDARD_PAGE_SIZES_MM.items()
+            for orientation in ("Portrait", "Landscape")
+        }
+    )
@@ -1,42 +1,97 @@
+import atexit
+import hashlib
+import inspect
 import random
-from functools import cache
+import threading
+import time
+from functools import cache, lru_cache
 from io import BytesIO
 from string import capwords
 from typing import Tuple
 
 import httpx
 from joblib import Memory, Parallel, delayed
-from PIL import Image, ImageDraw, ImageFilter, ImageOps
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps
 
 from .config import Config as config
 
 # Create a cache object
 memory = Memory(location=config.CACHE_DIR, verbose=0)
-# Clear old cache entries
-memory.reduce_size(age_limit=config.CACHE_AGE_LIMIT)
+# Marks when old cache entries were last cleared
+_REDUCE_SENTINEL = config.CACHE_DIR / ".last_reduce"
 
 
+def _reduce_cache():
+    try:
+        memory.reduce_size(age_limit=config.CACHE_AGE_LIMIT)
+    except OSError:
+        # Another process may be using or clearing the cache, try next interval
+        pass
+    finally:
+        _REDUCE_SENTINEL.parent.mkdir(parents=True, exist_ok=True)
+        _REDUCE_SENTINEL.touch()
+
+
+# Clear old cache entries on exit, at most once per interval, as walking the
+# cache directory gets slow when it is large
+if (
+    not _REDUCE_SENTINEL.exists()
+    or time.time() - _REDUCE_SENTINEL.stat().st_mtime
+    > config.CACHE_REDUCE_INTERVAL.total_seconds()
+):
+    atexit.register(_reduce_cache)
+
+# Resampling filter for resizing, e.g. Image.BICUBIC is faster at lower quality
+RESAMPLE_FILTER = Image.LANCZOS
+
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def _client() -> httpx.Client:
+    """
+    Returns the HTTP client shared by all PokeAPI and sprite requests.
+    Reusing it keeps connections alive between requests.
+    """
+
+    global _CLIENT
+
+    # Locked, as the first call can come from several worker threads at once
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = httpx.Client()
+            atexit.register(_CLIENT.close)
+    return _CLIENT
+
+
+@cache
 @memory.cache
 def get_types():
     """
     Retrieves the types of Pokemon from the PokeAPI.
     Store everything in lowercase.
+    Kept in memory after the first call to avoid reloading the disk cache.
     """
 
     url = f"{config.POKEAPI_URL}type"
 
     types = {}
 
-    with httpx.Client() as client:
-        response = client.get(url)
-        results = response.json()["results"]
-        for type in [client.get(type["url"]).json() for type in results]:
-            type_name = type["name"].lower()
-            types[type_name] = []
-            for pokemon in type["pokemon"]:
-                name = pokemon["pokemon"]["name"].lower()
-                id = int(pokemon["pokemon"]["url"].split("/")[-2])
-                types[type_name].append({"name": name, "id": id})
+    client = _client()
+    response = client.get(url)
+    results = response.json()["results"]
+    # Fetch the type details concurrently over the shared client
+    responses = Parallel(n_jobs=-1, backend="threading")(
+        delayed(client.get)(type["url"]) for type in results
+    )
+    for type in [response.json() for response in responses]:
+        type_name = type["name"].lower()
+        types[type_name] = []
+        for pokemon in type["pokemon"]:
+            name = pokemon["pokemon"]["name"].lower()
+            id = int(pokemon["pokemon"]["url"].split("/")[-2])
+            types[type_name].append({"name": name, "id": id})
 
     return types
 
@@ -60,7 +115,7 @@ def get_pokedex_types():
 def get_pokedex(type_filter: str = None):
     if type_filter:
         type_filter = type_filter.lower()
-        if type_filter in get_types().keys():
+        if type_filter in get_types():
             return {
                 k: v["name"]
                 for k, v in get_pokedex_types().items()
@@ -69,6 +124,11 @@ def get_pokedex(type_filter: str = None):
     return {k: v["name"] for k, v in get_pokedex_types().items()}
 
 
+@cache
+def _pokedex_ids():
+    return tuple(get_pokedex())
+
+
 def pokemon_id2name(pokemon_id: int) -> str:
     """
     Converts a Pokemon ID to its name.
@@ -116,10 +176,10 @@ def pokemon_id2types(pokemon_id: int) -> list:
     return get_pokedex_types().get(pokemon_id, {}).get("types", [])
 
 
-@memory.cache
 def get_image_by_id(pokemon_id: int) -> Image.Image:
     """
     Retrieves the image of a Pokemon based on its ID.
+    Returns a copy, so the caller may modify it.
 
     Args:
         pokemon_id (int): The ID of the Pokemon.
@@ -128,36 +188,48 @@ def get_image_by_id(pokemon_id: int) -> Image.Image:
         Image: The image of the Pokemon.
     """
 
-    with httpx.Client() as client:
-        # Check Pokemon ID: 10270
-        # Pokemon ID: 10267
+    return _get_shared_image_by_id(pokemon_id).copy()
 
-        try:
-            im = client.get(
-                f"{config.SPRITES_URL}pokemon/other/official-artwork/{pokemon_id}.png"
-            ).content
-            return Image.open(BytesIO(im))
-        except Exception:
-            pass
 
-        try:
-            im = client.get(
-                f"{config.SPRITES_URL}pokemon/other/home/{pokemon_id}.png"
-            ).content
-            return Image.open(BytesIO(im))
-        except Exception:
-            pass
+@lru_cache(maxsize=64)
+def _get_shared_image_by_id(pokemon_id: int) -> Image.Image:
+    # Recent images are kept in memory to skip loading them from the disk cache.
+    # The same object is shared by all callers and threads, so never modify it.
+    return _get_image_by_id_cached(pokemon_id)
 
+
+@memory.cache
+def _get_image_by_id_cached(pokemon_id: int) -> Image.Image:
+    client = _client()
+    # Check Pokemon ID: 10270
+    # Pokemon ID: 10267
+
+    urls = (
+        f"{config.SPRITES_URL}pokemon/other/official-artwork/{pokemon_id}.png",
+        f"{config.SPRITES_URL}pokemon/other/home/{pokemon_id}.png",
+        f"{config.SPRITES_URL}pokemon/{pokemon_id}.png",
+    )
+
+    for url in urls:
         try:
-            im = client.get(f"{config.SPRITES_URL}pokemon/{pokemon_id}.png").content
-            return Image.open(BytesIO(im))
+            response = client.get(url)
+            # Missing sprites return an error page instead of an image
+            if response.status_code == 200:
+                image = Image.open(BytesIO(response.content))
+                # Decode now so the cache and all threads share the pixels
+                image.load()
+                return image
         except Exception:
             pass
 
+    # Raise rather than return None, so a failed download is not cached
+    raise ValueError(f"No image found for Pokemon ID: {pokemon_id}")
+
 
 def get_image_by_name(pokemon_name: str) -> Image.Image:
     """
     Retrieves the image of a Pokemon based on its name.
+    Returns a copy, so the caller may modify it.
 
     Args:
         pokemon_name (str): The name of the Pokemon.
@@ -172,33 +244,35 @@ def get_image_by_name(pokemon_name: str) -> Image.Image:
 
 @memory.cache
 def get_pokemon_print_name(pokemon_id, language="en"):
-    with httpx.Client() as client:
-        url = f"{config.POKEAPI_URL}pokemon-species/{pokemon_id}"
-        response = client.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            for entry in data["names"]:
-                if entry["language"]["name"] == language:
-                    return entry["name"]
-
-        url = f"{config.POKEAPI_URL}pokemon/{pokemon_id}"
-        response = client.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            name = data["name"]
-            for form in data["forms"]:
-                if form["name"] == name:
-                    response = client.get(form["url"])
-                    if response.status_code == 200:
-                        data = response.json()
-                        for entry in data["names"]:
-                            if entry["language"]["name"] == language:
-                                return entry["name"]
-
-        return capwords(pokemon_id2name(pokemon_id).replace("-", " "))  # Fallback
-
-
-def img_resize(image: Image.Image, max_width: int, max_height: int) -> Image.Image:
+    client = _client()
+    url = f"{config.POKEAPI_URL}pokemon-species/{pokemon_id}"
+    response = client.get(url)
+    if response.status_code == 200:
+        data = response.json()
+        for entry in data["names"]:
+            if entry["language"]["name"] == language:
+                return entry["name"]
+
+    url = f"{config.POKEAPI_URL}pokemon/{pokemon_id}"
+    response = client.get(url)
+    if response.status_code == 200:
+        data = response.json()
+        name = data["name"]
+        for form in data["forms"]:
+            if form["name"] == name:
+                response = client.get(form["url"])
+                if response.status_code == 200:
+                    data = response.json()
+                    for entry in data["names"]:
+                        if entry["language"]["name"] == language:
+                            return entry["name"]
+
+    return capwords(pokemon_id2name(pokemon_id).replace("-", " "))  # Fallback
+
+
+def img_resize(
+    image: Image.Image, max_width: int, max_height: int, resample: int = None
+) -> Image.Image:
     """
     Resize the given image while maintaining its aspect ratio.
 
@@ -206,6 +280,7 @@ def img_resize(image: Image.Image, max_width: int, max_height: int) -> Image.Ima
         image (Image): The image to be resized.
         max_width (int): The maximum width of the resized image.
         max_height (int): The maximum height of the resized image.
+        resample (int, optional): The resampling filter. Defaults to RESAMPLE_FILTER.
 
     Returns:
         Image: The resized image.
@@ -218,7 +293,10 @@ def img_resize(image: Image.Image, max_width: int, max_height: int) -> Image.Ima
         h = max_height
         w = int(image.width * (h / image.height))
 
-    return image.resize((w, h), resample=Image.LANCZOS)
+    if resample is None:
+        resample = RESAMPLE_FILTER
+
+    return image.resize((w, h), resample=resample)
 
 
 def create_coloring_image(
@@ -231,18 +309,50 @@ def create_coloring_image(
     color: bool = False,
 ) -> Image.Image:
     """
-    Creates a coloring page from the given image.
+    Creates a coloring page from the image of the given Pokemon.
+    Results are cached on disk, keyed on the resample filter and pipeline source.
 
     Args:
-        image (Image): The input image.
+        pokemon_id (int): The ID of the Pokemon.
+        max_width (int): The maximum width of the coloring image.
+        max_height (int): The maximum height of the coloring image.
         noise_threshold (float, optional): The threshold value for noise removal. Defaults to 0.05.
+        histogram_cutoff (float, optional): The fraction of the histogram to cut off when stretching contrast. Defaults to 0.1.
+        crop (bool, optional): Whether to crop the image to its content. Defaults to True.
+        color (bool, optional): Whether to keep the image in color instead of drawing contours. Defaults to False.
 
     Returns:
         Image: The coloring page image.
     """
 
-    # Get the image of the Pokemon
-    image = get_image_by_id(pokemon_id)
+    return _create_coloring_image_cached(
+        pokemon_id,
+        max_width,
+        max_height,
+        noise_threshold,
+        histogram_cutoff,
+        crop,
+        color,
+        RESAMPLE_FILTER,
+        _COLORING_PIPELINE_KEY,
+    )
+
+
+@memory.cache
+def _create_coloring_image_cached(
+    pokemon_id: int,
+    max_width: int,
+    max_height: int,
+    noise_threshold: float,
+    histogram_cutoff: float,
+    crop: bool,
+    color: bool,
+    resample: int,
+    pipeline_key: str,
+) -> Image.Image:
+
+    # Get the shared image of the Pokemon, every step below returns a new image
+    image = _get_shared_image_by_id(pokemon_id)
 
     # Create white background if image is RGBA
     if image.mode == "RGBA":
@@ -258,7 +368,7 @@ def create_coloring_image(
             image = ImageOps.expand(image, border=1, fill="WHITE")
 
     # Resize the image
-    image = img_resize(image, max_width, max_height)
+    image = img_resize(image, max_width, max_height, resample=resample)
 
     if not color:
         # Convert to grayscale
@@ -269,9 +379,12 @@ def create_coloring_image(
         image = image.filter(ImageFilter.SMOOTH)
         # Get contours
         image = image.filter(ImageFilter.CONTOUR)
-        # Remove noise
-        image = image.point(lambda p: 255 if p > 255 * (1 - noise_threshold) else p)
-        image = image.point(lambda p: 0 if p < 255 * noise_threshold else p)
+        # Remove noise, pushing near-white to white and near-black to black
+        high = 255 * (1 - noise_threshold)
+        low = 255 * noise_threshold
+        image = image.point(
+            [255 if p > high else 0 if p < low else p for p in range(256)]
+        )
         # Stretch histogram
         image = ImageOps.autocontrast(image, cutoff=histogram_cutoff * 100, ignore=255)
         # Remove padding
@@ -280,16 +393,67 @@ def create_coloring_image(
     return image
 
 
-def parallel_cache_pokeapi_calls(ids):
+def _source_key(*funcs) -> str:
+    # Hash of the source of the given functions, unwrapping cache decorators
+    source = "".join(
+        inspect.getsource(inspect.unwrap(getattr(func, "func", func))) for func in funcs
+    )
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+# joblib only tracks the source of the cached function itself, so cached
+# coloring images are also keyed on the source of the helpers they use
+_COLORING_PIPELINE_KEY = _source_key(
+    _get_image_by_id_cached, _get_shared_image_by_id, img_resize
+)
+
+
+def _report_error(message: str, errors: list = None):
+    # Collect the message for the caller to show, or print it
+    if errors is None:
+        print(message)
+    else:
+        errors.append(message)
+
+
+def parallel_cache_pokeapi_calls(ids, errors: list = None) -> set:
     """
     Parallelize the cache calls to the PokeAPI.
     Will cache the image and print name of the Pokemon.
+    Failed downloads are reported and retried when the data is needed.
+
+    Args:
+        ids (list): The IDs of the Pokemon to cache.
+        errors (list, optional): A list to collect error messages in. Printed if not given.
+
+    Returns:
+        set: The IDs of the Pokemon that could not be cached.
     """
-    Parallel(n_jobs=-1, backend="threading")(
-        [delayed(get_image_by_id)(i) for i in ids]
-        + [delayed(get_pokemon_print_name)(i) for i in ids]
+
+    def try_call(func, pokemon_id):
+        try:
+            func(pokemon_id)
+        except (httpx.HTTPError, ValueError) as e:
+            return pokemon_id, e
+
+    results = Parallel(n_jobs=-1, backend="threading")(
+        [delayed(try_call)(_get_shared_image_by_id, i) for i in ids]
+        + [delayed(try_call)(get_pokemon_print_name, i) for i in ids]
     )
 
+    # Report on the calling thread, so messages from workers do not interleave
+    failed = set()
+    for result in results:
+        if result is not None:
+            pokemon_id, e = result
+            _report_error(
+                f"Unable to cache data for Pokemon ID: {pokemon_id}. Error: {e}",
+                errors,
+            )
+            failed.add(pokemon_id)
+
+    return failed
+
 
 def generate_pokemon_coloring_page(
     page_height_mm: float = config.PAGE_HEIGHT_MM,
@@ -304,6 +468,7 @@ def generate_pokemon_coloring_page(
     exclude_list: list = [],
     color: bool = False,
     crop: bool = True,
+    errors: list = None,
 ) -> Tuple[Image.Image, list]:
     """
     Generate a sheet of Pokemon coloring pages.
@@ -321,6 +486,7 @@ def generate_pokemon_coloring_page(
         exclude_list (list): A list of Pokemon IDs to exclude from the sheet. Defaults to an empty list.
         color (bool): Whether to generate a colored sheet. Defaults to False.
         crop (bool): Whether to crop the images. Defaults to True.
+        errors (list): A list to collect error messages in. Printed if not given.
 
     Returns:
         Tuple[Image, list]: A tuple containing the output image and the updated exclude list.
@@ -338,6 +504,11 @@ def generate_pokemon_coloring_page(
 
     # Create a new image for the paper
     output_image = Image.new("RGB", (PAGE_WIDTH, PAGE_HEIGHT), "white")
+    draw = ImageDraw.Draw(output_image)
+
+    # Load the font once for all text on the page
+    font = ImageFont.load_default(size=FONT_SIZE)
+    line_spacing = int(0.2 * FONT_SIZE)
 
     # Calculate the size of each image box
     IMAGE_BOX_WIDTH = (PAGE_WIDTH - 2 * OUTER_MARGIN) // columns
@@ -347,40 +518,64 @@ def generate_pokemon_coloring_page(
     MAX_IMAGE_WIDTH = IMAGE_BOX_WIDTH - 2 * INNER_MARGIN
     MAX_IMAGE_HEIGHT = IMAGE_BOX_HEIGHT - 2 * INNER_MARGIN
 
-    for i in range(rows):
-        for j in range(columns):
+    def create_cell_image(pokemon_id):
+        try:
+            return create_coloring_image(
+                pokemon_id,
+                MAX_IMAGE_WIDTH,
+                MAX_IMAGE_HEIGHT,
+                color=color,
+                crop=crop,
+            )
+        except Exception as e:
+            # Reported after the round, so messages from workers do not interleave
+            return e
+
+    # Pick a Pokemon for every empty cell and create their images in parallel.
+    # Cells that failed are filled with the next pick in another round.
+    cell_ids = [None] * (rows * columns)
+    cell_images = [None] * (rows * columns)
+    pokedex_ids = _pokedex_ids()
+
+    while None in cell_images:
+        empty_cells = [k for k, image in enumerate(cell_images) if image is None]
+
+        for k in empty_cells:
             while True:
-                try:
-                    if len(include_list) > 0:
-                        pokemon_id = include_list[0]
-                    else:
-                        pokemon_id = random.choice(list(get_pokedex().keys()))
-
-                    coloring_image = create_coloring_image(
-                        pokemon_id,
-                        MAX_IMAGE_WIDTH,
-                        MAX_IMAGE_HEIGHT,
-                        color=color,
-                        crop=crop,
-                    )
-
-                except Exception as e:
-                    print(f"Error: {e}")
-                    print(
-                        f"Unable to generate coloring page for Pokemon ID: {pokemon_id}"
-                    )
-                    if pokemon_id in include_list:
-                        include_list.remove(pokemon_id)
-                    continue
-
-                # Remove the pokemon from the include list
-                if pokemon_id in include_list:
+                if len(include_list) > 0:
+                    pokemon_id = include_list[0]
+                    # Remove the pokemon from the include list
                     include_list.remove(pokemon_id)
+                else:
+                    pokemon_id = random.choice(pokedex_ids)
 
                 if pokemon_id not in exclude_list:
                     exclude_list.append(pokemon_id)
                     break
 
+            cell_ids[k] = pokemon_id
+
+        images = Parallel(n_jobs=-1, backend="threading")(
+            delayed(create_cell_image)(cell_ids[k]) for k in empty_cells
+        )
+
+        for k, image in zip(empty_cells, images):
+            if isinstance(image, Exception):
+                _report_error(
+                    f"Unable to generate coloring page for Pokemon ID: {cell_ids[k]}."
+                    f" Error: {image}",
+                    errors,
+                )
+                exclude_list.remove(cell_ids[k])
+                image = None
+            cell_images[k] = image
+
+    for i in range(rows):
+        for j in range(columns):
+            k = i * columns + j
+            pokemon_id = cell_ids[k]
+            coloring_image = cell_images[k]
+
             x = j * IMAGE_BOX_WIDTH + OUTER_MARGIN
             y = i * IMAGE_BOX_HEIGHT + OUTER_MARGIN
 
@@ -389,26 +584,20 @@ def generate_pokemon_coloring_page(
 
             output_image.paste(coloring_image, (x + dx, y + dy))
 
-            draw = ImageDraw.Draw(output_image)
-
-            line_spacing = int(0.2 * FONT_SIZE)
-
             draw.text(
                 (x + INNER_MARGIN, y + INNER_MARGIN),
                 f"#{pokemon_id} - {get_pokemon_print_name(pokemon_id)}",
                 fill=config.COLOR_NAMES,
-                font_size=FONT_SIZE,
+                font=font,
             )
             draw.text(
                 (x + INNER_MARGIN, y + INNER_MARGIN + line_spacing + FONT_SIZE),
                 f"{'\n'.join([capwords(t) for t in pokemon_id2types(pokemon_id)])}",
                 fill=config.COLOR_TYPES,
-                font_size=FONT_SIZE,
+                font=font,
                 spacing=line_spacing,
             )
 
-    draw = ImageDraw.Draw(output_image)
-
     # Draw horizontal lines
     for i in range(rows - 1):
         y = IMAGE_BOX_HEIGHT * (i + 1) + OUTER_MARGIN
@@ -432,7 +621,7 @@ def generate_pokemon_coloring_page(
         (PAGE_WIDTH - OUTER_MARGIN, PAGE_HEIGHT - OUTER_MARGIN),
         config.ATTRIBUTION,
         fill=config.COLOR_ATTRIBUTION,
-        font_size=FONT_SIZE,
+        font=font,
         anchor="rd",
     )
 